@@ -1,8 +1,9 @@
 from flask import Flask, jsonify, send_from_directory
 from anthropic import Anthropic
-import re
+import functools
+import gzip
+import hashlib
 import requests
-import io
 import json
 import random
 import threading
@@ -10,7 +11,14 @@ from queue import Queue
 import time
 from dotenv import load_dotenv
 import os
-from pypdf import PdfReader
+# pyahocorasick finds every GRI term in one pass; without it each term is found with str.find
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+# Downloading, page extraction and text cleanup live in pdfile (one copy of the
+# session, worker pool and compiled patterns); this module adds caching and GRI analysis
+from pdfile import PDFScraper as BasePDFScraper, SESSION, download_to_spool, extract_pdf_text
 from GRI_STANDARDS_DATABASE import GRI_STANDARDS, BIAS_FLUFF_WORDS
 
 
@@ -31,48 +39,175 @@ PDF_URLS = [
 ]
 
 GAME_STATE_FILE = 'game_state.json'  # file to persist used PDFs state
+PDF_CACHE_DIR = 'pdf_cache'          # extracted PDF text, persisted across restarts
+LLM_CACHE_DIR = 'llm_cache'          # Claude responses keyed by prompt content hash
 
 # Preloading system to avoid wait times for the user
 preloaded_games = Queue(maxsize=2)  # Store up to 2 preloaded games logic
 preload_lock = threading.Lock()     # Thread safety for queue access
 is_preloading = False               # Flag to prevent multiple preloader threads
 
-class PDFScraper:
-    def __init__(self):
-        self.pdfs_processed = 0
+def content_hash(text):
+    """Short stable hash of a string, used as a cache key"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+def write_file_atomic(path, data):
+    """Write bytes to a temp file first so a concurrent reader never sees a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def fetch_pdf_text(url):
+    """Downloads a PDF and extracts its text. Raises on network or parsing errors."""
+    # Stream the body to a spooled file instead of holding response.content in memory
+    with download_to_spool(url) as f:
+        # Limit to first 50 pages to prevent processing overload on huge reports, and stop
+        # early once 200 KB of text is in hand (far more than one game round needs)
+        text, max_pages = extract_pdf_text(f, max_pages=50, max_chars=200_000)
+    
+    print(f"✅ Successfully extracted text from PDF ({len(text)} chars, {max_pages} pages)")
+    return text
+
+# Cache key of the PDF text most recently loaded for each URL
+_pdf_cache_keys = {}
+_pdf_cache_keys_lock = threading.Lock()
+
+def pdf_cache_key(url):
+    """
+    Cache key for a PDF's extracted text: the URL plus whatever version marker the
+    server offers (ETag, Last-Modified or size), fetched with a cheap HEAD request,
+    so an updated report at the same URL is downloaded again.
+    If the HEAD request fails, the key last used for the URL is reused.
+    """
+    try:
+        headers = SESSION.head(url, timeout=15, allow_redirects=True).headers
+    except requests.RequestException:
+        # Without a version marker, the text already loaded for this URL is the best guess
+        with _pdf_cache_keys_lock:
+            last_key = _pdf_cache_keys.get(url)
+        return last_key or content_hash(url + '\n')
+    version = headers.get('ETag') or headers.get('Last-Modified') or headers.get('Content-Length') or ''
+    return content_hash(url + '\n' + version)
+
+def remember_pdf_cache_key(url, cache_key):
+    """Records cache_key as the URL's current version and deletes the text cached for its previous one"""
+    with _pdf_cache_keys_lock:
+        previous_key = _pdf_cache_keys.get(url)
+        _pdf_cache_keys[url] = cache_key
+    if previous_key is not None and previous_key != cache_key:
+        try:
+            os.remove(os.path.join(PDF_CACHE_DIR, previous_key + '.txt.gz'))
+        except FileNotFoundError:
+            pass
+
+def download_pdf_text_cached(url):
+    """
+    fetch_pdf_text, cached per version of the PDF. The HEAD request behind the
+    cache key runs on every call, so a report republished at the same URL is
+    picked up without restarting the server.
+    """
+    return load_pdf_text(pdf_cache_key(url), url)
+
+@functools.lru_cache(maxsize=32)
+def load_pdf_text(cache_key, url):
+    """Memoized fetch_pdf_text, also persisted gzipped to PDF_CACHE_DIR so restarts skip the download"""
+    cache_path = os.path.join(PDF_CACHE_DIR, cache_key + '.txt.gz')
+    try:
+        with open(cache_path, 'rb') as f:
+            print(f"💾 Loaded cached PDF text for {url}")
+            text = gzip.decompress(f.read()).decode('utf-8')
+        remember_pdf_cache_key(url, cache_key)
+        return text
+    except FileNotFoundError:
+        pass
+    
+    text = fetch_pdf_text(url)
+    if text:
+        write_file_atomic(cache_path, gzip.compress(text.encode('utf-8')))
+        remember_pdf_cache_key(url, cache_key)
+    return text
+
+def load_llm_cache(key):
+    """Return a cached Claude response for key, or None on a miss"""
+    try:
+        with open(os.path.join(LLM_CACHE_DIR, key + '.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_llm_cache(key, value):
+    """Persist a Claude response so the same prompt never hits the API twice"""
+    write_file_atomic(os.path.join(LLM_CACHE_DIR, key + '.json'), json.dumps(value).encode('utf-8'))
+
+# GRI analysis results keyed by content_hash of the analyzed text
+_gri_analysis_cache = {}
 
+# (original, lowercased) pairs for every GRI term and bias word, lowercased once at import
+_GRI_PREPARED = {
+    gri_code: {
+        'keywords': [(keyword, keyword.lower()) for keyword in standard['keywords']],
+        'metrics': [(metric, metric.lower()) for metric in standard['required_metrics']]
+    }
+    for gri_code, standard in GRI_STANDARDS.items()
+}
+_BIAS_PREPARED = [(bias_word, bias_word.lower()) for bias_word in BIAS_FLUFF_WORDS]
+
+# Every lowercased GRI keyword, GRI metric and bias word, without duplicates
+_GRI_TERMS = frozenset(
+    [term for prepared in _GRI_PREPARED.values() for _, term in prepared['keywords'] + prepared['metrics']]
+    + [bias_lower for _, bias_lower in _BIAS_PREPARED]
+)
+
+def build_gri_automaton():
+    """Builds one Aho-Corasick automaton over every GRI term (None without pyahocorasick)"""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for term in _GRI_TERMS:
+        if term:
+            automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+# Lets a single linear pass over the report find every term, however many terms there are.
+# Built at import so the first analysis doesn't pay for it
+_GRI_AUTOMATON = build_gri_automaton()
+
+def find_first_ends(text_lower):
+    """Maps each GRI term found in text_lower to the (inclusive) index where it first ends"""
+    first_ends = {}
+    if _GRI_AUTOMATON is not None:
+        for end, term in _GRI_AUTOMATON.iter(text_lower):
+            first_ends.setdefault(term, end)
+    else:
+        for term in _GRI_TERMS:
+            start = text_lower.find(term) if term else -1
+            if start >= 0:
+                first_ends[term] = start + len(term) - 1
+    return first_ends
+
+class PDFScraper(BasePDFScraper):
     def download_pdf_text(self, url):
         """Downloads a PDF from a URL and extracts its text"""
         print(f"📄 Downloading PDF from {url}...")
         try:
-            # unique user agent to avoid being blocked by some servers
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            
-            f = io.BytesIO(response.content)
-            reader = PdfReader(f)
-            
-            text = ""
-            # Limit to first 50 pages to prevent processing overload on huge reports
-            max_pages = min(50, len(reader.pages))
-            for i, page in enumerate(reader.pages[:max_pages]): 
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
-            
+            # Failures raise, so only successful extractions are cached
+            text = download_pdf_text_cached(url)
             self.pdfs_processed += 1
-            print(f"✅ Successfully extracted text from PDF ({len(text)} chars, {max_pages} pages)")
             return text
         except Exception as e:
             print(f"❌ Error processing {url}: {e}")
             return ""
 
-    def clean_text(self, text):
-        """Removes extra whitespace and normalizes text"""
-        return re.sub(r'\s+', ' ', text).strip()
-
     def analyze_gri_compliance(self, pdf_content):
         """Compare PDF content against GRI standards"""
+        cache_key = content_hash(pdf_content)
+        if cache_key in _gri_analysis_cache:
+            print("\n🔍 Reusing cached GRI analysis for this PDF")
+            return _gri_analysis_cache[cache_key]
+        
         print("\n🔍 Analyzing PDF against GRI Standards...")
         
         pdf_lower = pdf_content.lower()
@@ -83,18 +218,14 @@ class PDFScraper:
             'compliant_standards': []
         }
         
+        # Where each term first ends (inclusive index), found in one pass over the text
+        first_ends = find_first_ends(pdf_lower)
+        
         # Check each GRI standard
         for gri_code, standard in GRI_STANDARDS.items():
-            keywords_found = []
-            metrics_found = []
-            
-            for keyword in standard['keywords']:
-                if keyword.lower() in pdf_lower:
-                    keywords_found.append(keyword)
-            
-            for metric in standard['required_metrics']:
-                if metric.lower() in pdf_lower:
-                    metrics_found.append(metric)
+            prepared = _GRI_PREPARED[gri_code]
+            keywords_found = [keyword for keyword, keyword_lower in prepared['keywords'] if keyword_lower in first_ends]
+            metrics_found = [metric for metric, metric_lower in prepared['metrics'] if metric_lower in first_ends]
             
             if not keywords_found and not metrics_found:
                 analysis['missing_standards'].append({
@@ -118,32 +249,34 @@ class PDFScraper:
                 })
         
         # Check for bias/fluff words
+        # Limit to top 5 bias findings to avoid overwhelming the analysis
         bias_findings = []
-        for bias_word in BIAS_FLUFF_WORDS:
-            if bias_word.lower() in pdf_lower:
-                pattern = r'(.{0,50}' + re.escape(bias_word) + r'.{0,50})'
-                matches = re.findall(pattern, pdf_lower, re.IGNORECASE)
-                if matches:
-                    bias_findings.append({
-                        'word': bias_word,
-                        'context': matches[0].strip()
-                    })
-        
-        if bias_findings:
-            # Limit to top 5 bias findings to avoid overwhelming the analysis
-            for finding in bias_findings[:5]:
-                analysis['misleading_content'].append({
-                    'code': 'BIAS',
-                    'title': 'Marketing Language',
-                    'reason': f"Uses subjective term '{finding['word']}' without data",
-                    'word': finding['word']
+        for bias_word, bias_lower in _BIAS_PREPARED:
+            if len(bias_findings) >= 5:
+                break
+            end = first_ends.get(bias_lower)
+            if end is not None:
+                # Up to 50 characters either side of the first occurrence
+                start = end + 1 - len(bias_word)
+                bias_findings.append({
+                    'word': bias_word,
+                    'context': pdf_lower[max(0, start - 50):end + 51].strip()
                 })
         
+        for finding in bias_findings:
+            analysis['misleading_content'].append({
+                'code': 'BIAS',
+                'title': 'Marketing Language',
+                'reason': f"Uses subjective term '{finding['word']}' without data",
+                'word': finding['word']
+            })
+        
         print(f"\n📊 GRI Compliance Analysis:")
         print(f"   ❌ Missing Standards: {len(analysis['missing_standards'])}")
         print(f"   ⚠️  Misleading Content: {len(analysis['misleading_content'])}")
         print(f"   ✅ Compliant Standards: {len(analysis['compliant_standards'])}")
         
+        _gri_analysis_cache[cache_key] = analysis
         return analysis
 
 def load_game_state():
@@ -185,6 +318,11 @@ def extract_company_name(pdf_content):
     max_chars = 8000
     truncated_content = pdf_content[:max_chars]
     
+    cache_key = 'company-' + content_hash(truncated_content)
+    cached = load_llm_cache(cache_key)
+    if cached is not None:
+        return cached
+    
     message = client.messages.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=100,
@@ -204,6 +342,9 @@ Respond with ONLY the company name, nothing else. No explanations."""
     )
     
     company_name = message.content[0].text.strip()
+    # An empty reply would otherwise be replayed for this PDF forever
+    if company_name:
+        save_llm_cache(cache_key, company_name)
     return company_name
 
 def generate_words_from_pdf(pdf_content, company_name, gri_analysis, count=5):
@@ -233,6 +374,11 @@ def generate_words_from_pdf(pdf_content, company_name, gri_analysis, count=5):
     
     gri_context = "\n".join(gri_context_parts) if gri_context_parts else "No GRI analysis available"
     
+    cache_key = 'words-' + content_hash("\n".join([truncated_content, gri_context, company_name, str(count)]))
+    cached = load_llm_cache(cache_key)
+    if cached is not None:
+        return cached['words'], cached['clues']
+    
     message = client.messages.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=2000,
@@ -291,7 +437,11 @@ No explanations, no numbering, just word then clue, alternating."""
             clues.append(line)
     
     # Return limited count
-    return words[:count], clues[:count]
+    words, clues = words[:count], clues[:count]
+    # Only cache complete replies, so a malformed one isn't replayed on every later pick
+    if len(words) == len(clues) == count:
+        save_llm_cache(cache_key, {'words': words, 'clues': clues})
+    return words, clues
 
 @app.route('/')
 def index():
@@ -299,23 +449,8 @@ def index():
     return send_from_directory('.', 'game.html')
 
 
-def generate_game_data():
-    """Generate game data from next random PDF (used by preloader and on-demand)"""
-    print("\n" + "="*60)
-    print("🎮 Generating Game Data...")
-    print("="*60)
-    
-    # Get next PDF
-    pdf_url = get_next_pdf()
-    print(f"\n📌 Selected PDF: {pdf_url}")
-    
-    # Process PDF
-    scraper = PDFScraper()
-    pdf_content = scraper.download_pdf_text(pdf_url)
-    
-    if not pdf_content:
-        return None
-    
+def build_game_data(scraper, pdf_content):
+    """Turn extracted PDF text into game data (GRI analysis + Claude words/clues)"""
     # Clean text
     cleaned_content = scraper.clean_text(pdf_content)
     
@@ -342,18 +477,64 @@ def generate_game_data():
     }
 
 
+def generate_game_data():
+    """Generate game data from next random PDF (used on-demand)"""
+    print("\n" + "="*60)
+    print("🎮 Generating Game Data...")
+    print("="*60)
+    
+    # Get next PDF
+    pdf_url = get_next_pdf()
+    print(f"\n📌 Selected PDF: {pdf_url}")
+    
+    # Process PDF
+    scraper = PDFScraper()
+    pdf_content = scraper.download_pdf_text(pdf_url)
+    
+    if not pdf_content:
+        return None
+    
+    return build_game_data(scraper, pdf_content)
+
+
+def generate_game_batch(count):
+    """
+    Generate several games at once, downloading their PDFs concurrently (used by preloader).
+    Yields each game as soon as it is built; a game that fails is skipped, not the whole batch
+    """
+    print("\n" + "="*60)
+    print(f"🎮 Generating {count} Game(s)...")
+    print("="*60)
+    
+    pdf_urls = [get_next_pdf() for _ in range(count)]
+    for pdf_url in pdf_urls:
+        print(f"\n📌 Selected PDF: {pdf_url}")
+    
+    # Downloads run concurrently, each through the cached download_pdf_text
+    scraper = PDFScraper()
+    pdf_contents = scraper.download_pdf_texts(pdf_urls)
+    
+    for pdf_url, pdf_content in zip(pdf_urls, pdf_contents):
+        if not pdf_content:
+            continue
+        try:
+            yield build_game_data(scraper, pdf_content)
+        except Exception as e:
+            print(f"⚠️ Failed to build game from {pdf_url}: {e}")
+
+
 def preload_game_worker():
     """Background worker that keeps games preloaded"""
     global is_preloading
     while True:
         # Check if we need more games in the buffer
-        if preloaded_games.qsize() < 2 and not is_preloading:
+        missing = preloaded_games.maxsize - preloaded_games.qsize()
+        if missing > 0 and not is_preloading:
             with preload_lock:
                 is_preloading = True
             try:
-                print("🔄 Background: Preloading next game...")
-                game_data = generate_game_data()
-                if game_data:
+                print("🔄 Background: Preloading next game(s)...")
+                for game_data in generate_game_batch(missing):
                     preloaded_games.put(game_data)
                     print(f"✅ Background: Game preloaded (queue size: {preloaded_games.qsize()})")
             except Exception as e:
@@ -1,34 +1,335 @@
+import contextlib
+import functools
 import requests
-import io
+from requests.adapters import HTTPAdapter
+import multiprocessing
+import os
 import re
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+# pyahocorasick checks many keywords in one pass; without it each keyword is checked with `in`
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 from pypdf import PdfReader
 
+# PyMuPDF (a binding to the MuPDF C library) extracts text many times faster than
+# pure-Python pypdf. It is optional: without it, the pypdf path below is used.
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF releases before 1.24 only install the fitz name
+    except ImportError:
+        pymupdf = None
+
 # PDF Scraper Utility Class
 # Handles downloading, reading, and simple text analysis of PDF documents
-import io
-import re
-from pypdf import PdfReader
+
+# Pre-compiled regex patterns (compiled once at import instead of on every call)
+_WS_RE = re.compile(r'\s+')
+_SENT_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_DIGIT_RE = re.compile(r'\d')
+_ASCII_DIGITS = frozenset('0123456789')
+# Number (int/float) + optional space, the prefix of every metric pattern
+# Matches the "1,000.50 " in "1,000.50 tons"
+_METRIC_NUMBER = r'\d+(?:,\d+)*(?:\.\d+)?\s*'
+
+def has_digit(s):
+    """
+    Same answer as _DIGIT_RE.search(s), but checks ASCII digits with a C-level set
+    test first. Only non-ASCII strings without an ASCII digit fall back to the regex,
+    since the regex digit class also matches other Unicode decimal digits.
+    """
+    if not _ASCII_DIGITS.isdisjoint(s):
+        return True
+    return not s.isascii() and _DIGIT_RE.search(s) is not None
+
+# Patterns built from caller-supplied keywords/metrics can't live at module scope,
+# so they are compiled once per distinct argument and cached here instead
+@functools.lru_cache(maxsize=128)
+def compile_keywords_regex(keywords_lower):
+    """One alternation over a tuple of lowercase keywords"""
+    return re.compile('|'.join(re.escape(kw) for kw in keywords_lower))
+
+@functools.lru_cache(maxsize=128)
+def build_keywords_automaton(keywords_lower):
+    """Aho-Corasick automaton over a tuple of lowercase keywords, for single-pass searching"""
+    automaton = ahocorasick.Automaton()
+    for kw in keywords_lower:
+        if kw:
+            automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+@functools.lru_cache(maxsize=128)
+def compile_metric_regex(metric_lower):
+    """A number followed by one lowercase metric unit; group 1 is the whole value"""
+    return re.compile('(' + _METRIC_NUMBER + re.escape(metric_lower) + ')')
+
+@functools.lru_cache(maxsize=128)
+def compile_any_metric_regex(metrics_lower):
+    """A number followed by any of a tuple of lowercase metric units"""
+    return re.compile(_METRIC_NUMBER + '(?:' + '|'.join(re.escape(m) for m in metrics_lower) + ')')
+
+# Shared HTTP session so repeat downloads reuse pooled keep-alive connections
+# (skips the TCP/TLS handshake on repeat hosts); retries cover transient connection errors
+SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=2)
+SESSION.mount('https://', _HTTP_ADAPTER)
+SESSION.mount('http://', _HTTP_ADAPTER)
+
+# PDFs larger than this are spooled to a temp file on disk instead of kept in memory
+PDF_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def download_to_spool(url):
+    """Streams a download into a spooled temp file rather than buffering the whole body."""
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    try:
+        # PDFs are already compressed internally, so ask for the body as-is rather than
+        # paying for a gzip layer (decode_content still handles servers that ignore this)
+        with SESSION.get(url, stream=True, timeout=60, headers={'Accept-Encoding': 'identity'}) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, spool, 1024 * 1024)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def page_may_have_text(page):
+    """
+    False for pages without any font resources (e.g. scanned images), whose
+    content streams would be decoded by extract_text only to yield no text.
+    Fonts used inside form XObjects count, since text can live there too.
+    """
+    resources = page.get('/Resources')
+    if resources is None:
+        return False
+    resources = resources.get_object()
+    if '/Font' in resources:
+        return True
+    xobjects = resources.get('/XObject')
+    if xobjects is None:
+        return False
+    return any(xobject.get_object().get('/Subtype') == '/Form' for xobject in xobjects.get_object().values())
+
+# A single pathological page can keep pypdf busy for minutes, so its extraction
+# is abandoned after this long (where SIGALRM is usable, see extract_page_text)
+PAGE_TIMEOUT_SECONDS = 10
+
+class PageTimeout(BaseException):
+    """
+    Raised from the SIGALRM handler when a page takes longer than PAGE_TIMEOUT_SECONDS.
+    A BaseException so `except Exception` blocks inside pypdf can't swallow it.
+    """
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+def extract_page_text(page):
+    """
+    page.extract_text(), giving up on the page after PAGE_TIMEOUT_SECONDS.
+    Signals only reach the main thread, so the timeout applies in the extraction
+    worker processes and in the main thread; other threads extract without one.
+    """
+    if not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        return page.extract_text()
+    
+    previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout)
+    previous_timer = (0.0, 0.0)
+    started = time.monotonic()
+    try:
+        previous_timer = signal.setitimer(signal.ITIMER_REAL, PAGE_TIMEOUT_SECONDS)
+        try:
+            return page.extract_text()
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except PageTimeout:
+        print(f"⏱️ Skipped a page that took over {PAGE_TIMEOUT_SECONDS}s to extract")
+        return ""
+    finally:
+        signal.signal(signal.SIGALRM, previous_handler)
+        # Re-arm a timer the caller had running, minus the time spent on this page
+        delay, interval = previous_timer
+        if delay > 0:
+            remaining = max(delay - (time.monotonic() - started), 1e-6)
+            signal.setitimer(signal.ITIMER_REAL, remaining, interval)
+
+def extract_pages_text(pages, max_chars=None):
+    """
+    Extracts text from an iterable of pypdf pages belonging to one already-parsed reader.
+    Stops after the page that brings the text to max_chars (None = no limit).
+    
+    Returns:
+        List of per-page texts, each ending in a newline
+    """
+    parts = []
+    total_chars = 0
+    for page in pages:
+        if not page_may_have_text(page):
+            continue
+        extracted = extract_page_text(page)
+        if extracted and not extracted.isspace():
+            parts.append(extracted + "\n")
+            total_chars += len(extracted) + 1
+            if max_chars is not None and total_chars >= max_chars:
+                break
+    return parts
+
+def extract_page_range(pdf_path, start, stop, max_chars=None):
+    """Extracts per-page texts from pages [start, stop) of a PDF file. Runs inside a worker process."""
+    return extract_pages_text(islice(PdfReader(pdf_path).pages, start, stop), max_chars)
+
+@contextlib.contextmanager
+def pdf_file_path(f):
+    """
+    Yields a filesystem path for the open PDF file f, so worker processes can open it
+    themselves instead of each being sent a pickled copy of its bytes. Files without
+    a path of their own (e.g. a download spool) are copied to a temp file on disk.
+    """
+    name = getattr(f, 'name', None)
+    if isinstance(name, str) and os.path.isfile(name):
+        yield name
+        return
+    
+    tmp = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
+    try:
+        with tmp:
+            f.seek(0)
+            shutil.copyfileobj(f, tmp, 1024 * 1024)
+        yield tmp.name
+    finally:
+        os.remove(tmp.name)
+
+def join_pages_text(page_texts, max_chars=None):
+    """Joins per-page texts in order, stopping after the page that reaches max_chars"""
+    parts = []
+    total_chars = 0
+    for page_text in page_texts:
+        parts.append(page_text)
+        total_chars += len(page_text)
+        if max_chars is not None and total_chars >= max_chars:
+            break
+    # Join once at the end instead of re-copying a growing string for every page
+    return "".join(parts)
+
+# PyMuPDF is not thread-safe, and PDFs are extracted from several download threads
+# at once, so only one thread at a time may be inside MuPDF
+_mupdf_lock = threading.Lock()
+
+def extract_pdf_text_mupdf(f, max_pages=None, max_chars=None):
+    """Extracts text from an open PDF file with PyMuPDF. Same output shape as the pypdf path."""
+    name = getattr(f, 'name', None)
+    # MuPDF needs an in-memory buffer for files that have no path; read it before
+    # taking the lock so other threads' extraction isn't held up by the read
+    data = None if isinstance(name, str) and os.path.isfile(name) else f.read()
+    with _mupdf_lock:
+        doc = pymupdf.open(name, filetype='pdf') if data is None else pymupdf.open(stream=data, filetype='pdf')
+        with doc:
+            num_pages = len(doc) if max_pages is None else min(max_pages, len(doc))
+            parts = []
+            total_chars = 0
+            for page in doc.pages(0, num_pages):
+                extracted = page.get_text("text")
+                if extracted and not extracted.isspace():
+                    parts.append(extracted + "\n")
+                    total_chars += len(extracted) + 1
+                    if max_chars is not None and total_chars >= max_chars:
+                        break
+            return "".join(parts), num_pages
+
+# One worker pool shared by every extraction, so PDFs downloaded concurrently queue
+# their pages onto the same processes instead of each starting a pool of its own
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+def get_extract_pool():
+    """Returns the shared page-extraction process pool, creating it on first use"""
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # The pool is first used from download threads of a multi-threaded server, and
+            # forking there can copy a lock another thread holds (stdout, urllib3's pool)
+            # into the worker, deadlocking it. forkserver starts workers from a clean,
+            # single-threaded process instead (Windows only has spawn, which is safe too)
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _extract_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context(start_method))
+        return _extract_pool
+
+def discard_extract_pool(pool):
+    """Drops a broken pool so the next extraction starts a fresh one"""
+    global _extract_pool
+    with _extract_pool_lock:
+        # Another thread may already have replaced it after hitting the same failure
+        if _extract_pool is pool:
+            _extract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_pdf_text(f, max_pages=None, max_chars=None):
+    """
+    Extracts text from an open PDF file, splitting its pages across worker processes
+    (pypdf's extract_text is pure Python, so threads would serialize on the GIL).
+    Pages after the one that brings the text to max_chars are dropped (None = no limit).
+    
+    Returns:
+        Tuple of (text, number of pages read)
+    """
+    if pymupdf is not None:
+        return extract_pdf_text_mupdf(f, max_pages, max_chars)
+    
+    # Parse once here, reading from the file itself rather than a copy of its bytes;
+    # the in-process path keeps using this reader's page list
+    pages = PdfReader(f).pages
+    num_pages = len(pages)
+    if max_pages is not None:
+        num_pages = min(max_pages, num_pages)
+    
+    workers = min(os.cpu_count() or 1, num_pages)
+    if workers <= 1:
+        return "".join(extract_pages_text(islice(pages, num_pages), max_chars)), num_pages
+    
+    step = -(-num_pages // workers)  # ceiling division
+    starts = list(range(0, num_pages, step))
+    stops = [min(start + step, num_pages) for start in starts]
+    # Each chunk also stops at max_chars, since no single chunk can need more than that.
+    # Chunks are consumed in page order; leaving the loop early cancels any not yet started
+    pool = get_extract_pool()
+    try:
+        with pdf_file_path(f) as pdf_path:
+            chunks = pool.map(extract_page_range, [pdf_path] * len(starts), starts, stops, [max_chars] * len(starts))
+            page_texts = (page_text for chunk in chunks for page_text in chunk)
+            return join_pages_text(page_texts, max_chars), num_pages
+    except BrokenProcessPool:
+        # A worker died (killed for memory, or crashed inside a malformed PDF). The pool
+        # can't run anything after that, so replace it and extract this PDF in-process
+        print("⚠️ PDF extraction worker died, extracting in-process instead")
+        discard_extract_pool(pool)
+        return "".join(extract_pages_text(islice(pages, num_pages), max_chars)), num_pages
 
 class PDFScraper:
     def __init__(self):
         self.pdfs_processed = 0
+        # Per-sentence features of the last text split, shared across analyses
+        self._sentence_table = {'text': None}
 
     def download_pdf_text(self, url):
         """Downloads a PDF from a URL and extracts its text (all pages)."""
         print(f"Downloading PDF from {url}...")
         try:
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            
-            f = io.BytesIO(response.content)
-            reader = PdfReader(f)
-            
-            text = ""
-            # Extract text from all pages
-            for page in reader.pages: 
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
+            # Stream the body to a spooled file instead of holding response.content in memory
+            with download_to_spool(url) as f:
+                # Extract text from all pages
+                text, _ = extract_pdf_text(f)
             
             self.pdfs_processed += 1
             print(f"✅ Successfully extracted text from PDF ({self.pdfs_processed} processed)")
@@ -38,17 +339,20 @@ class PDFScraper:
             print(f"❌ Error processing {url}: {e}")
             return ""
 
+    def download_pdf_texts(self, urls):
+        """Downloads several PDFs concurrently. Returns texts in the same order as urls."""
+        if not urls:
+            return []
+        # Downloads are network-bound, so threads overlap the waiting on each server
+        with ThreadPoolExecutor(max_workers=min(8, len(urls))) as executor:
+            return list(executor.map(self.download_pdf_text, urls))
+
     def read_local_pdf(self, filepath):
         """Reads a PDF from local file path and extracts its text."""
         print(f"Reading PDF from {filepath}...")
         try:
-            reader = PdfReader(filepath)
-            
-            text = ""
-            for page in reader.pages:
-                extracted = page.extract_text()
-                if extracted:
-                    text += extracted + "\n"
+            with open(filepath, 'rb') as f:
+                text, _ = extract_pdf_text(f)
             
             self.pdfs_processed += 1
             print(f"✅ Successfully extracted text from PDF ({self.pdfs_processed} processed)")
@@ -60,62 +364,151 @@ class PDFScraper:
     def clean_text(self, text):
         """Removes extra whitespace and normalizes text."""
         # Replace multiple spaces/newlines with single space
-        return re.sub(r'\s+', ' ', text).strip()
+        return _WS_RE.sub(' ', text).strip()
+
+    def iter_sentences(self, text, min_length=30):
+        """
+        Yields sentences longer than min_length one at a time, without building
+        the full list of raw splits first. Lets callers stop scanning early.
+        """
+        # Split by punctuation followed by space (lookbehind assertion)
+        prev = 0
+        for match in _SENT_SPLIT_RE.finditer(text):
+            sentence = text[prev:match.start()]
+            if len(sentence) > min_length:
+                yield sentence.strip()
+            prev = match.end()
+        tail = text[prev:]
+        if len(tail) > min_length:
+            yield tail.strip()
 
     def split_into_sentences(self, text):
         """Splits text into sentences (filters out very short ones)."""
-        # Split by punctuation followed by space (lookbehind assertion)
-        sentences = re.split(r'(?<=[.!?])\s+', text)
         # Filter noise (sentences shorter than 30 chars are usually not useful content)
-        return [s.strip() for s in sentences if len(s) > 30]
+        return list(self.iter_sentences(text, min_length=30))
+
+    def get_sentence_table(self, text):
+        """
+        Returns parallel per-sentence lists for text: 'sentences' and 'lower'
+        (each sentence lowercased once). The table is reused when the same text
+        is analyzed again (e.g. search_keywords followed by extract_metrics),
+        and extra columns such as 'has_digit' are added to it on first use.
+        """
+        if self._sentence_table['text'] != text:
+            sentences = self.split_into_sentences(text)
+            self._sentence_table = {
+                'text': text,
+                'sentences': sentences,
+                'lower': [s.lower() for s in sentences]
+            }
+        return self._sentence_table
+
+    def split_into_sentences_lower(self, text):
+        """Returns (sentences, lowercased sentences) for text, from the shared sentence table."""
+        table = self.get_sentence_table(text)
+        return table['sentences'], table['lower']
+
+    def get_text_lower(self, text):
+        """Returns text lowercased, computed once per text and kept in the sentence table."""
+        table = self.get_sentence_table(text)
+        if 'text_lower' not in table:
+            table['text_lower'] = text.lower()
+        return table['text_lower']
+
+    def sentence_digit_flags(self, text):
+        """Returns whether each sentence of text contains a digit, computed once per text."""
+        table = self.get_sentence_table(text)
+        if 'has_digit' not in table:
+            table['has_digit'] = [has_digit(s) for s in table['sentences']]
+        return table['has_digit']
 
     def search_keywords(self, text, keywords):
         """
         Searches for keywords in text.
         Returns dict with keyword matches and relevant sentences.
         """
-        text_lower = text.lower()
-        sentences = self.split_into_sentences(text)
+        text_lower = self.get_text_lower(text)
+        sentences, sentences_lower = self.split_into_sentences_lower(text)
         
         results = {
             'found_keywords': [],      # List of keywords actually found
             'relevant_sentences': []   # Sentences containing any of the keywords
         }
         
-        # Check existence of each keyword
-        for keyword in keywords:
-            if keyword.lower() in text_lower:
+        # Check existence of every keyword in one pass over the text, stopping
+        # as soon as all of them have been seen
+        keywords_lower = tuple(kw.lower() for kw in keywords)
+        wanted = {kw for kw in keywords_lower if kw}
+        seen = set()
+        if wanted and ahocorasick is not None:
+            for _, kw in build_keywords_automaton(keywords_lower).iter(text_lower):
+                seen.add(kw)
+                if len(seen) == len(wanted):
+                    break
+        elif wanted:
+            seen = {kw for kw in wanted if kw in text_lower}
+        
+        for keyword, kw in zip(keywords, keywords_lower):
+            # An empty keyword is trivially "in" any text
+            if not kw or kw in seen:
                 results['found_keywords'].append(keyword)
         
-        # Extract context sentences
-        for sentence in sentences:
-            if any(kw.lower() in sentence.lower() for kw in keywords):
+        # A keyword missing from the whole text can't be in any sentence, so only
+        # the found ones go into the sentence pattern (and none means no scan at all)
+        if not results['found_keywords']:
+            return results
+        
+        # Extract context sentences (one combined pattern scans each sentence once)
+        keywords_re = compile_keywords_regex(tuple(kw.lower() for kw in results['found_keywords']))
+        for sentence, sent_lower in zip(sentences, sentences_lower):
+            if keywords_re.search(sent_lower):
                 results['relevant_sentences'].append(sentence)
         
         return results
 
-    def extract_metrics(self, text, metric_patterns):
+    def extract_metrics(self, text, metric_patterns, max_per_metric=None):
         """
         Extracts numerical metrics from text based on patterns.
         
         Args:
             text: The text to search
             metric_patterns: List of metric units to look for (e.g., ['tons', 'kwh', '%'])
+            max_per_metric: Stop collecting a metric after this many matches (None = no limit).
+                Scanning stops entirely once every metric has reached the limit, so a
+                limit of 0 or less returns no matches.
         
         Returns:
             List of tuples: (value, metric, sentence)
         """
-        sentences = self.split_into_sentences(text)
+        if not metric_patterns or (max_per_metric is not None and max_per_metric <= 0):
+            return []
+        
+        if max_per_metric is None:
+            sentences, sentences_lower = self.split_into_sentences_lower(text)
+            sentence_rows = zip(sentences, sentences_lower, self.sentence_digit_flags(text))
+        else:
+            # Split lazily so sentences after the last needed match are never produced
+            sentence_rows = (
+                (s, s.lower(), has_digit(s)) for s in self.iter_sentences(text)
+            )
         metrics_found = []
         
-        for sentence in sentences:
-            sent_lower = sentence.lower()
+        # Pattern: number (int/float) + optional space + metric
+        # Matches: "1,000.50 tons", "50%", "3.5 kwh"
+        metric_regexes = [(metric, compile_metric_regex(metric.lower())) for metric in metric_patterns]
+        # One alternation over every metric rules out most sentences with a single search
+        any_metric_re = compile_any_metric_regex(tuple(m.lower() for m in metric_patterns))
+        
+        match_counts = dict.fromkeys(metric_patterns, 0)
+        for sentence, sent_lower, sentence_has_digit in sentence_rows:
+            if not metric_regexes:
+                break
+            # Every metric value starts with a number, so digit-free sentences are skipped outright
+            if not sentence_has_digit or not any_metric_re.search(sent_lower):
+                continue
             
-            for metric in metric_patterns:
-                # Pattern: number (int/float) + optional space + metric
-                # Matches: "1,000.50 tons", "50%", "3.5 kwh"
-                pattern = r'(\d+(?:,\d+)*(?:\.\d+)?\s*' + re.escape(metric.lower()) + r')'
-                match = re.search(pattern, sent_lower)
+            for metric, metric_re in metric_regexes:
+                match = metric_re.search(sent_lower)
                 
                 if match:
                     metrics_found.append({
@@ -123,6 +516,11 @@ class PDFScraper:
                         'metric': metric,        # The unit
                         'sentence': sentence     # Context
                     })
+                    match_counts[metric] += 1
+            
+            # Drop metrics that have collected enough matches
+            if max_per_metric is not None:
+                metric_regexes = [(m, r) for m, r in metric_regexes if match_counts[m] < max_per_metric]
         
         return metrics_found
 
@@ -147,7 +545,7 @@ if __name__ == "__main__":
         print(f"Relevant sentences: {len(results['relevant_sentences'])}")
         
         # Extract metrics
-        metrics = scraper.extract_metrics(cleaned, ['tons', 'kwh', '%', 'mwh'])
+        metrics = scraper.extract_metrics(cleaned, ['tons', 'kwh', '%', 'mwh'], max_per_metric=3)
         print(f"\nFound {len(metrics)} metrics:")
         for m in metrics[:3]:  # Show first 3
             print(f"  - {m['value']} in: {m['sentence'][:100]}...")
@@ -0,0 +1,87 @@
+import pytest
+import requests
+
+import main
+
+
+class FakeHeadResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def head_headers(monkeypatch):
+    """Headers returned by the HEAD request behind pdf_cache_key; set to an exception to fail it"""
+    headers = {}
+    
+    def fake_head(url, **kwargs):
+        if isinstance(headers.get('raise'), Exception):
+            raise headers['raise']
+        return FakeHeadResponse(headers)
+    
+    monkeypatch.setattr(main.SESSION, 'head', fake_head)
+    return headers
+
+
+@pytest.fixture
+def pdf_cache(tmp_path, monkeypatch):
+    """Empty PDF text caches on disk and in memory, with downloads replaced by a counter"""
+    monkeypatch.setattr(main, 'PDF_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(main, '_pdf_cache_keys', {})
+    downloads = []
+    
+    def fake_fetch(url):
+        downloads.append(url)
+        return f"text of download {len(downloads)}"
+    
+    monkeypatch.setattr(main, 'fetch_pdf_text', fake_fetch)
+    main.load_pdf_text.cache_clear()
+    yield tmp_path
+    main.load_pdf_text.cache_clear()
+
+
+URL = "https://example.com/report.pdf"
+
+
+def test_pdf_cache_key_follows_etag(head_headers):
+    head_headers['ETag'] = '"v1"'
+    first = main.pdf_cache_key(URL)
+    assert main.pdf_cache_key(URL) == first
+    head_headers['ETag'] = '"v2"'
+    assert main.pdf_cache_key(URL) != first
+    assert main.pdf_cache_key("https://example.com/other.pdf") != main.pdf_cache_key(URL)
+
+
+@pytest.mark.parametrize('header', ['Last-Modified', 'Content-Length'])
+def test_pdf_cache_key_falls_back_to_other_version_headers(head_headers, header):
+    head_headers[header] = 'one'
+    first = main.pdf_cache_key(URL)
+    head_headers[header] = 'two'
+    assert main.pdf_cache_key(URL) != first
+
+
+def test_pdf_cache_key_survives_head_failure(head_headers, pdf_cache):
+    head_headers['raise'] = requests.ConnectionError()
+    assert main.pdf_cache_key(URL) == main.pdf_cache_key(URL)
+
+
+def test_pdf_cache_key_reuses_last_key_when_head_fails(head_headers, pdf_cache):
+    head_headers['ETag'] = '"v1"'
+    assert main.download_pdf_text_cached(URL) == "text of download 1"
+    v1_key = main.pdf_cache_key(URL)
+    
+    head_headers['raise'] = requests.ConnectionError()
+    assert main.pdf_cache_key(URL) == v1_key
+    assert main.download_pdf_text_cached(URL) == "text of download 1"
+
+
+def test_new_pdf_version_replaces_cached_file(head_headers, pdf_cache):
+    head_headers['ETag'] = '"v1"'
+    main.download_pdf_text_cached(URL)
+    v1_file = pdf_cache / (main.pdf_cache_key(URL) + '.txt.gz')
+    assert v1_file.exists()
+    
+    head_headers['ETag'] = '"v2"'
+    assert main.download_pdf_text_cached(URL) == "text of download 2"
+    assert not v1_file.exists()
+    assert [p.name for p in pdf_cache.iterdir()] == [main.pdf_cache_key(URL) + '.txt.gz']
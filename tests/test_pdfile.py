@@ -0,0 +1,133 @@
+import signal
+
+import pytest
+from pypdf import PdfReader
+from pypdf.generic import DictionaryObject, NameObject
+
+import pdfile
+from pdfile import PDFScraper
+
+TEXT = (
+    "In 2023 our offices emitted 1,200 tons of carbon dioxide overall. "
+    "Renewable sources supplied 45% of the electricity we consumed this year. "
+    "We are proud of the progress our teams have made on every front. "
+    "Logistics added a further 300 tons of emissions across the supply chain. "
+    "Data centres used 5,000 mwh while running at 80% of their capacity."
+)
+
+
+def write_pdf(path, page_texts):
+    """Writes a minimal PDF with one line of Helvetica text per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_numbers = []
+    for text in page_texts:
+        content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        page_numbers.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % n for n in page_numbers)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_numbers))
+    
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+    return path
+
+
+@pytest.fixture
+def sample_pdf(tmp_path, monkeypatch):
+    # Always exercise the pypdf path, even where PyMuPDF happens to be installed
+    monkeypatch.setattr(pdfile, 'pymupdf', None)
+    return write_pdf(tmp_path / 'sample.pdf', [f"Page {i} reports {i * 10} tons of emissions" for i in range(12)])
+
+
+def resources_page(resources):
+    """A bare page dictionary with the given /Resources, or none at all"""
+    page = DictionaryObject({NameObject('/Type'): NameObject('/Page')})
+    if resources is not None:
+        page[NameObject('/Resources')] = resources
+    return page
+
+
+def xobjects(subtype):
+    return DictionaryObject({NameObject('/XObject'): DictionaryObject({
+        NameObject('/X0'): DictionaryObject({NameObject('/Subtype'): NameObject(subtype)}),
+    })})
+
+
+def test_page_may_have_text(sample_pdf):
+    assert pdfile.page_may_have_text(PdfReader(sample_pdf).pages[0])
+    assert pdfile.page_may_have_text(resources_page(xobjects('/Form')))
+    assert not pdfile.page_may_have_text(resources_page(xobjects('/Image')))
+    assert not pdfile.page_may_have_text(resources_page(DictionaryObject()))
+    assert not pdfile.page_may_have_text(resources_page(None))
+
+
+def test_extract_pages_text_stops_at_char_budget(sample_pdf):
+    pages = PdfReader(sample_pdf).pages
+    assert len(pdfile.extract_pages_text(pages)) == 12
+    # The page that reaches the budget is kept whole, later pages are skipped
+    assert len(pdfile.extract_pages_text(pages, max_chars=1)) == 1
+    assert len(pdfile.extract_pages_text(pages, max_chars=80)) == 3
+
+
+def test_join_pages_text_stops_at_char_budget():
+    assert pdfile.join_pages_text(["aaa\n", "bbb\n", "ccc\n"], max_chars=5) == "aaa\nbbb\n"
+    assert pdfile.join_pages_text(["aaa\n", "bbb\n", "ccc\n"], max_chars=8) == "aaa\nbbb\n"
+    assert pdfile.join_pages_text(["aaa\n", "bbb\n", "ccc\n"]) == "aaa\nbbb\nccc\n"
+
+
+@pytest.mark.parametrize('max_chars', [None, 1, 100, 250])
+def test_parallel_and_serial_extraction_agree(sample_pdf, monkeypatch, max_chars):
+    monkeypatch.setattr(pdfile.os, 'cpu_count', lambda: 1)
+    with open(sample_pdf, 'rb') as f:
+        serial = pdfile.extract_pdf_text(f, max_chars=max_chars)
+    monkeypatch.setattr(pdfile.os, 'cpu_count', lambda: 4)
+    with open(sample_pdf, 'rb') as f:
+        parallel = pdfile.extract_pdf_text(f, max_chars=max_chars)
+    assert parallel == serial
+    assert serial[0].startswith("Page 0 reports 0 tons of emissions\n")
+
+
+def test_extract_page_text_restores_callers_timer(sample_pdf):
+    page = PdfReader(sample_pdf).pages[0]
+    signal.setitimer(signal.ITIMER_REAL, 30)
+    try:
+        assert pdfile.extract_page_text(page) == "Page 0 reports 0 tons of emissions"
+        assert 0 < signal.getitimer(signal.ITIMER_REAL)[0] <= 30
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def test_extract_metrics_limits_matches_per_metric():
+    metrics = PDFScraper().extract_metrics(TEXT, ['tons', '%', 'mwh'], max_per_metric=1)
+    assert [(m['value'], m['metric']) for m in metrics] == [
+        ('1,200 tons', 'tons'),
+        ('45%', '%'),
+        ('5,000 mwh', 'mwh'),
+    ]
+
+
+@pytest.mark.parametrize('max_per_metric', [0, -1])
+def test_extract_metrics_non_positive_limit_returns_nothing(max_per_metric):
+    assert PDFScraper().extract_metrics(TEXT, ['tons', '%', 'mwh'], max_per_metric=max_per_metric) == []
+
+
+def test_extract_metrics_without_limit_matches_full_scan():
+    scraper = PDFScraper()
+    unlimited = scraper.extract_metrics(TEXT, ['tons', '%', 'mwh'])
+    limited = scraper.extract_metrics(TEXT, ['tons', '%', 'mwh'], max_per_metric=10)
+    assert unlimited == limited
+    assert len(unlimited) == 5